@@ -1,10 +1,11 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, asdict
+from typing import ClassVar, Dict, Optional, Tuple
+import copy
 import json
 import os
 from loguru import logger
 
-@dataclass
+@dataclass(slots=True)
 class Config:
     video_path: str = "input.mp4"
     window_width: int = 1280
@@ -18,11 +19,14 @@ class Config:
     export_path: str = "exports"
     model_path: str = "models/yolov8n.pt"
 
+    # Parsed configs keyed by absolute path, tagged with the file mtime they were read at
+    _cache: ClassVar[Dict[str, Tuple[float, 'Config']]] = {}
+
     def save(self, path: str = "config.json") -> None:
         """Save configuration to JSON file."""
         try:
             with open(path, "w") as f:
-                json.dump(self.__dict__, f, indent=4)
+                json.dump(asdict(self), f, indent=4)
             logger.info(f"Configuration saved to {path}")
         except Exception as e:
             logger.error(f"Failed to save configuration: {e}")
@@ -32,9 +36,15 @@ class Config:
         """Load configuration from JSON file."""
         try:
             if os.path.exists(path):
-                with open(path, "r") as f:
-                    data = json.load(f)
-                    return cls(**data)
+                key = os.path.abspath(path)
+                mtime = os.path.getmtime(path)
+                cached = cls._cache.get(key)
+                if cached is None or cached[0] != mtime:
+                    with open(path, "r") as f:
+                        data = json.load(f)
+                    cached = (mtime, cls(**data))
+                    cls._cache[key] = cached
+                return copy.copy(cached[1])
             logger.warning(f"No configuration file found at {path}, using defaults")
             return cls()
         except Exception as e:
@@ -43,19 +53,29 @@ class Config:
 
     def validate(self) -> bool:
         """Validate configuration values."""
+        # Explicit checks rather than asserts so validation survives python -O
+        checks = (
+            (self.window_width > 0, "Window width must be positive"),
+            (self.window_height > 0, "Window height must be positive"),
+            (self.known_distance_m > 0, "Known distance must be positive"),
+            (self.frame_skip > 0, "Frame skip must be positive"),
+            (self.buffer_size > 0, "Buffer size must be positive"),
+            (self.speed_unit in ("km/h", "mph"), "Invalid speed unit"),
+        )
+        for ok, message in checks:
+            if not ok:
+                logger.error(f"Configuration validation failed: {message}")
+                return False
+
+        try:
+            os.stat(self.model_path)
+        except OSError as e:
+            logger.error(f"Configuration validation failed: Model file not accessible: {e}")
+            return False
+
         try:
-            assert self.window_width > 0, "Window width must be positive"
-            assert self.window_height > 0, "Window height must be positive"
-            assert self.known_distance_m > 0, "Known distance must be positive"
-            assert self.frame_skip > 0, "Frame skip must be positive"
-            assert self.buffer_size > 0, "Buffer size must be positive"
-            assert self.speed_unit in ["km/h", "mph"], "Invalid speed unit"
-            assert os.path.exists(self.model_path), "Model file not found"
-            
-            if not os.path.exists(self.export_path):
-                os.makedirs(self.export_path)
-                
-            return True
-        except AssertionError as e:
-            logger.error(f"Configuration validation failed: {e}")
-            return False
\ No newline at end of file
+            os.makedirs(self.export_path, exist_ok=True)
+        except OSError as e:
+            logger.error(f"Configuration validation failed: Export path not usable: {e}")
+            return False
+        return True
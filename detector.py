@@ -1,18 +1,73 @@
+import math
 import cv2
 import numpy as np
+from loguru import logger
+from utils import GlyphCache, blit, njit, render_text
+
+
+@njit(cache=True, fastmath=True)
+def _kf_step(x, vx, y, vy, p00, p01, p11, q, r, mx, my):
+    """One predict/update step of the constant-velocity filter on both axes."""
+    # Predict: F = [[1, 1], [0, 1]], Q = q * [[1/4, 1/2], [1/2, 1]]
+    x += vx
+    y += vy
+    p00 += 2.0 * p01 + p11 + 0.25 * q
+    p01 += p11 + 0.5 * q
+    p11 += q
+
+    # Update: H = [1, 0]
+    s = p00 + r
+    k0 = p00 / s
+    k1 = p01 / s
+    ex = mx - x
+    ey = my - y
+    x += k0 * ex
+    vx += k1 * ex
+    y += k0 * ey
+    vy += k1 * ey
+    p11 -= k1 * p01
+    p01 -= k0 * p01
+    p00 -= k0 * p00
+    return x, vx, y, vy, p00, p01, p11
+
+
+def _cuda_available():
+    """True when OpenCV was built with CUDA and a device is present."""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
+
+def _opencl_gpu_available():
+    """True when OpenCV's transparent API can run on an OpenCL GPU."""
+    try:
+        if not cv2.ocl.haveOpenCL():
+            return False
+        device = cv2.ocl.Device.getDefault()
+        return device.available() and bool(device.type() & cv2.ocl.DEVICE_TYPE_GPU)
+    except (AttributeError, cv2.error):
+        return False
+
 
 class VehicleSpeedDetector:
     def __init__(self, known_distance_m=10):
         self.known_distance_m = known_distance_m
-        self.prev_centers = []  # Store multiple previous centers for smoothing
-        self.prev_speeds = []   # Store previous speeds for averaging
         self.scale_m_per_px = None
         self.fps = None
+        self._speed_scale = None
         self.show_speed = True
-        self.object_selected = False
-        self.selected_box = None
-        self.speed_window = 5   # Number of frames to average speed over
-        self.max_speed_change = 10.0  # Maximum allowed speed change between frames (km/h)
+        # Last click as (x, y, generation), replaced as a whole by select_object
+        # so the processing thread never sees a half-updated selection
+        self._selection = (0, 0, 0)
+        self._applied_gen = 0  # Generation process_frame last reset its state for
+        # Constant-velocity Kalman filter over the centroid, one frame per step.
+        # x and y share the same dynamics and noise, so a single covariance
+        # (p00, p01, p11) serves both axes.
+        self._kf_x = None  # [x, vx, y, vy] in pixels and pixels/frame
+        self._kf_P = None  # [p00, p01, p11]
+        self._kf_Q = 0.5   # Process noise (acceleration variance, px^2/frame^4)
+        self._kf_R = 4.0   # Measurement noise (centroid jitter variance, px^2)
         # Optimized background subtractor parameters
         self.fgbg = cv2.createBackgroundSubtractorMOG2(
             history=100,  # Reduced history for faster processing
@@ -20,120 +75,240 @@ class VehicleSpeedDetector:
             detectShadows=False  # Disable shadow detection for performance
         )
         # Cache for frame processing
+        self.proc_width = 640  # Background subtraction runs at this width
         self.frame_size = None
+        self._frame_hw = None  # Full-frame (h, w) the buffers below were sized for
+        self._perspective_k = 0.0  # Perspective gain per pixel of centroid height
+        self._proc_scale = 1.0
+        self._small = None   # Reused downsampled frame buffer
+        self._fgmask = None  # Reused foreground mask buffer, processing resolution
+        # Search window around the tracked vehicle, in processing-frame pixels
+        self.roi_margin = 50
+        self.roi_max_misses = 10  # Frames lost before falling back to full-frame search
+        self._roi = None  # (x0, y0, x1, y1)
+        self._roi_misses = 0
+        self.prev_center = None
         self.gaussian_kernel = (5, 5)
+        self._morph_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        # GPU mask pipeline: upload once, download only the small binary mask
+        self.use_cuda = _cuda_available()
+        if self.use_cuda:
+            self._stream = cv2.cuda_Stream()
+            self._gpu_frame = cv2.cuda_GpuMat()
+            self._gpu_fgbg = cv2.cuda.createBackgroundSubtractorMOG2(
+                history=100, varThreshold=40, detectShadows=False)
+            self._gpu_open = cv2.cuda.createMorphologyFilter(
+                cv2.MORPH_OPEN, cv2.CV_8UC1, self._morph_kernel)
+        # Otherwise the same pipeline on UMat, kept in OpenCL device memory
+        self.use_opencl = not self.use_cuda and _opencl_gpu_available()
+        if self.use_opencl:
+            cv2.ocl.setUseOpenCL(True)
+        self._speed_glyphs = GlyphCache(cv2.FONT_HERSHEY_DUPLEX, 1.2, 3, (0, 255, 255))
+        # Fixed banner shown while a vehicle is tracked, rasterised once
+        sprite, mask, (ox, oy) = render_text("Tracking Vehicle", cv2.FONT_HERSHEY_SIMPLEX, 1.0, 3, (255, 255, 0))
+        self._tracking_banner = (sprite, mask, 20 - ox, 50 - oy)
         self.min_contour_area = 500  # Reduced minimum area for better tracking
 
-    def set_video_info(self, frame_width, fps):
+    def set_video_info(self, frame_width, fps, frame_height=None):
         # Calculate scale with perspective consideration
         # Assume standard 60-degree horizontal field of view
         fov_horizontal = 60  # degrees
         viewing_distance = frame_width / (2 * np.tan(np.radians(fov_horizontal/2)))
         self.scale_m_per_px = self.known_distance_m / (frame_width * np.cos(np.radians(30)))  # Assume 30-degree camera tilt
         self.fps = fps
+        # Pixels/frame -> km/h, folded into one multiplier
+        self._speed_scale = self.scale_m_per_px * self.fps * 3.6
+        if frame_height is not None:
+            self._setup_buffers(frame_width, frame_height)
+
+    def _setup_buffers(self, w, h):
+        """Size the processing buffers and per-frame constants for w x h input frames."""
+        if w > self.proc_width:
+            self._proc_scale = self.proc_width / w
+            self.frame_size = (self.proc_width, int(h * self._proc_scale))
+        else:
+            self._proc_scale = 1.0
+            self.frame_size = (w, h)
+        self._small = np.empty(self.frame_size[::-1] + (3,), np.uint8)
+        self._fgmask = np.empty(self.frame_size[::-1], np.uint8)
+        self._perspective_k = 0.5 / h
+        self._frame_hw = (h, w)
+
+    @property
+    def object_selected(self):
+        return self._selection[2] > 0
+
+    @property
+    def selected_box(self):
+        return self._selection[:2] if self._selection[2] else None
+
+    def select_point(self, x, y):
+        """Track the vehicle nearest to (x, y) from the next processed frame."""
+        # Tracking state is reset by process_frame when it sees the new generation
+        self._selection = (x, y, self._selection[2] + 1)
+        logger.info(f"Vehicle selected at: {(x, y)}")
 
     def select_object(self, event, x, y, flags, param):
+        """cv2.setMouseCallback adapter for select_point."""
         if event == cv2.EVENT_LBUTTONDOWN:
-            self.selected_box = (x, y)
-            self.object_selected = True
-            print(f"✅ Vehicle selected at: {self.selected_box}")
+            self.select_point(x, y)
+
+    def reset_filter(self, center):
+        """Restart the Kalman filter at a new centroid with unknown velocity."""
+        self._kf_x = [float(center[0]), 0.0, float(center[1]), 0.0]
+        self._kf_P = [self._kf_R, 0.0, 100.0]
+
+    def _kf_update(self, center):
+        """Advance the filter one frame and fold in a centroid measurement."""
+        x, vx, y, vy, p00, p01, p11 = _kf_step(
+            *self._kf_x, *self._kf_P, self._kf_Q, self._kf_R,
+            float(center[0]), float(center[1]))
+        self._kf_x = [x, vx, y, vy]
+        self._kf_P = [p00, p01, p11]
+        return vx, vy
+
+    def _update_roi(self, box):
+        """Re-centre the search window on the tracked box, or drop it once the vehicle is lost."""
+        if box is None:
+            self._roi_misses += 1
+            if self._roi_misses > self.roi_max_misses:
+                self._roi = None
+            return
+        self._roi_misses = 0
+        x, y, w, h = (int(v * self._proc_scale) for v in box[:4])
+        margin = self.roi_margin
+        if self._roi is not None:
+            rx0, ry0, rx1, ry1 = self._roi
+            if x <= rx0 or y <= ry0 or x + w >= rx1 or y + h >= ry1:
+                margin *= 2  # Blob touched the window edge, search wider next frame
+        fw, fh = self.frame_size
+        self._roi = (max(x - margin, 0), max(y - margin, 0),
+                     min(x + w + margin, fw), min(y + h + margin, fh))
+
+    def _foreground_mask_cuda(self, frame):
+        """Resize, background-subtract, threshold and open on the GPU; returns the host mask."""
+        stream = self._stream
+        self._gpu_frame.upload(frame, stream)
+        gpu = self._gpu_frame
+        if self._proc_scale != 1.0:
+            gpu = cv2.cuda.resize(gpu, self.frame_size, interpolation=cv2.INTER_AREA, stream=stream)
+        mask = self._gpu_fgbg.apply(gpu, -1.0, stream)
+        _, mask = cv2.cuda.threshold(mask, 200, 255, cv2.THRESH_BINARY, stream=stream)
+        mask = self._gpu_open.apply(mask, stream=stream)
+        mask.download(stream, self._fgmask)
+        stream.waitForCompletion()
+        return self._fgmask
+
+    def _foreground_mask_opencl(self, frame):
+        """Resize, background-subtract, threshold and open as UMat; returns the host mask."""
+        umat = cv2.UMat(frame)
+        if self._proc_scale != 1.0:
+            umat = cv2.resize(umat, self.frame_size, interpolation=cv2.INTER_AREA)
+        mask = self.fgbg.apply(umat)
+        cv2.threshold(mask, 200, 255, cv2.THRESH_BINARY, dst=mask)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._morph_kernel)
+        return mask.get()
 
     def process_frame(self, frame):
-        # Resize frame for faster processing if it's large
-        if self.frame_size is None:
-            h, w = frame.shape[:2]
-            if w > 1280:  # If width is larger than 1280px
-                self.frame_size = (1280, int(h * (1280/w)))
+        sel_x, sel_y, gen = self._selection
+        selected = gen > 0
+        if gen != self._applied_gen:
+            self._applied_gen = gen
+            self._kf_x = None
+            self._roi = None
+            self._roi_misses = 0
+
+        # Downsample for background subtraction and contour search; boxes
+        # are scaled back to full-frame coordinates below
+        if frame.shape[:2] != self._frame_hw:
+            self._setup_buffers(frame.shape[1], frame.shape[0])
                 
-        if self.frame_size:
-            process_frame = cv2.resize(frame, self.frame_size)
+        if self.use_cuda:
+            fgmask = self._foreground_mask_cuda(frame)
+        elif self.use_opencl:
+            fgmask = self._foreground_mask_opencl(frame)
         else:
-            process_frame = frame
+            if self._proc_scale != 1.0:
+                process_frame = cv2.resize(frame, self.frame_size, dst=self._small, interpolation=cv2.INTER_AREA)
+            else:
+                process_frame = frame
             
-        # Apply background subtraction and noise reduction
-        fgmask = self.fgbg.apply(process_frame)
+            # Apply background subtraction and noise reduction
+            fgmask = self.fgbg.apply(process_frame, self._fgmask)
+        
+        # Once a vehicle is locked on, only search a window around its last
+        # position. MOG2 still sees the whole frame so its model stays valid.
+        if selected and self._roi is not None:
+            rx0, ry0, rx1, ry1 = self._roi
+            fgmask = fgmask[ry0:ry1, rx0:rx1]
+        else:
+            rx0 = ry0 = 0
         
-        # Use threshold instead of Gaussian blur for faster processing
-        _, thresh = cv2.threshold(fgmask, 200, 255, cv2.THRESH_BINARY)
+        if not (self.use_cuda or self.use_opencl):
+            # Use threshold instead of Gaussian blur for faster processing
+            # (in place: the mask buffer is rewritten by the next apply anyway)
+            cv2.threshold(fgmask, 200, 255, cv2.THRESH_BINARY, dst=fgmask)
+            # Opening removes MOG2 speckle so fewer components get labelled
+            cv2.morphologyEx(fgmask, cv2.MORPH_OPEN, self._morph_kernel, dst=fgmask)
+        thresh = fgmask
         
-        # Find contours with optimized parameters
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # Label blobs and get their bounding boxes and areas in a single pass
+        _, _, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8)
         
         closest_contour = None
-        min_dist = float("inf")
         
-        # Process only the largest contours
-        contours = sorted(contours, key=cv2.contourArea, reverse=True)[:5]
+        # Process only the largest blobs (label 0 is the background)
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        min_area = self.min_contour_area * self._proc_scale * self._proc_scale
+        keep = np.flatnonzero(areas > min_area)
+        if len(keep) > 5:
+            # Only membership in the top five matters, not their order
+            keep = keep[np.argpartition(-areas[keep], 5)[:5]]
+        keep += 1
         
-        for contour in contours:
-            if cv2.contourArea(contour) > self.min_contour_area:
-                x, y, w, h = cv2.boundingRect(contour)
-                center = (x + w // 2, y + h // 2)
-                
-                if self.object_selected:
-                    sel_x, sel_y = self.selected_box
-                    # Use Manhattan distance for faster calculation
-                    dist = abs(center[0] - sel_x) + abs(center[1] - sel_y)
-                    if dist < min_dist:
-                        min_dist = dist
-                        closest_contour = (x, y, w, h, center)
+        if len(keep):
+            boxes = stats[keep, :4]
+            boxes[:, 0] += rx0
+            boxes[:, 1] += ry0
+            if self._proc_scale != 1.0:
+                boxes = (boxes / self._proc_scale).astype(int)
+            centers = boxes[:, :2] + boxes[:, 2:] // 2
+            if selected:
+                if self._roi is not None and self.prev_center is not None:
+                    ref = self.prev_center
                 else:
+                    ref = (sel_x, sel_y)
+                # Use Manhattan distance for faster calculation
+                dists = np.abs(centers - ref).sum(axis=1)
+                i = int(dists.argmin())
+                x, y, w, h = boxes[i].tolist()
+                closest_contour = (x, y, w, h, tuple(centers[i].tolist()))
+            else:
+                for x, y, w, h in boxes.tolist():
                     cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
 
+        if selected:
+            self._update_roi(closest_contour)
+
         speed_kmh = None
-        if self.object_selected and closest_contour:
+        if selected and closest_contour:
             x, y, w, h, center = closest_contour
             cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 255, 0), 2)
-            cv2.putText(frame, "Tracking Vehicle", (20, 50),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 0), 3, cv2.LINE_AA)
-
-            # Store current center
-            self.prev_centers.append(center)
-            if len(self.prev_centers) > self.speed_window:
-                self.prev_centers.pop(0)
-
-            if len(self.prev_centers) > 1:
-                # Calculate speed using multiple previous positions
-                speeds = []
-                for i in range(1, len(self.prev_centers)):
-                    prev = np.array(self.prev_centers[i-1])
-                    curr = np.array(self.prev_centers[i])
-                    
-                    # Apply perspective correction (objects further up in frame appear to move slower)
-                    perspective_factor = 1.0 + (curr[1] / frame.shape[0]) * 0.5
-                    
-                    pixel_distance = np.linalg.norm(curr - prev)
-                    distance_m = pixel_distance * self.scale_m_per_px * perspective_factor
-                    time_s = 1 / self.fps
-                    speed_mps = distance_m / time_s
-                    speeds.append(speed_mps * 3.6)  # Convert to km/h
-                
-                # Calculate weighted average of speeds (recent speeds count more)
-                weights = np.linspace(0.5, 1.0, len(speeds))
-                speed_kmh = np.average(speeds, weights=weights)
-                
-                # Apply Kalman-like filtering
-                if self.prev_speeds:
-                    prev_speed = self.prev_speeds[-1]
-                    max_change = self.max_speed_change
-                    if abs(speed_kmh - prev_speed) > max_change:
-                        speed_kmh = prev_speed + max_change * np.sign(speed_kmh - prev_speed)
-                
-                self.prev_speeds.append(speed_kmh)
-                if len(self.prev_speeds) > self.speed_window:
-                    self.prev_speeds.pop(0)
-                
-                # Use median for display to remove outliers
-                display_speed = np.median(self.prev_speeds)
+            sprite, mask, bx, by = self._tracking_banner
+            blit(frame, sprite, bx, by, mask)
+
+            if self._kf_x is None:
+                self.reset_filter(center)
+            else:
+                vx, vy = self._kf_update(center)
+                # Apply perspective correction (objects further up in frame appear to move slower)
+                perspective_factor = 1.0 + self._kf_x[2] * self._perspective_k
+                pixel_speed = math.hypot(vx, vy)
+                speed_kmh = pixel_speed * perspective_factor * self._speed_scale
 
                 if self.show_speed:
-                    # Add solid background rectangle for readability
-                    label = f"{display_speed:.1f} km/h"
-                    text_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_DUPLEX, 1.2, 3)[0]
-                    cv2.rectangle(frame, (x, y - text_size[1] - 10), 
-                                  (x + text_size[0] + 10, y), (0, 0, 0), -1)
-                    cv2.putText(frame, label, (x + 5, y - 5),
-                                cv2.FONT_HERSHEY_DUPLEX, 1.2, (0, 255, 255), 3, cv2.LINE_AA)
+                    # Label on a solid background for readability, blitted from cached glyphs
+                    self._speed_glyphs.draw(frame, f"{speed_kmh:.1f} km/h", x, y)
 
             self.prev_center = center
 
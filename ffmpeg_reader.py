@@ -0,0 +1,132 @@
+import shutil
+import subprocess
+import tempfile
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+from loguru import logger
+from exceptions import VideoLoadError
+
+
+class FFmpegYUVReader:
+    """Decode a video through an ffmpeg pipe with a cv2.VideoCapture-like API.
+
+    ffmpeg streams raw yuv420p (1.5 bytes per pixel, half of packed BGR) and
+    each frame is converted to BGR with cv2.cvtColor only when it is read.
+    Container metadata is taken from OpenCV without decoding any frames.
+    """
+
+    def __init__(self, video_path: str, ffmpeg: str = "ffmpeg"):
+        self.video_path = video_path
+        self.ffmpeg = shutil.which(ffmpeg) or ffmpeg
+
+        probe = cv2.VideoCapture(video_path)
+        if not probe.isOpened():
+            raise VideoLoadError(f"Cannot open video file: {video_path}")
+        self.width = int(probe.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(probe.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = probe.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(probe.get(cv2.CAP_PROP_FRAME_COUNT))
+        probe.release()
+        if self.width % 2 or self.height % 2:
+            raise VideoLoadError("yuv420p piping needs even frame dimensions")
+
+        self._yuv = np.empty((self.height * 3 // 2, self.width), np.uint8)
+        self._view = memoryview(self._yuv).cast("B")
+        self._proc: Optional[subprocess.Popen] = None
+        self._err = None  # ffmpeg's stderr, a file so it can never fill up and stall the pipe
+        self._pos = 0
+        self._start(0)
+
+    def _start(self, frame_no: int) -> bool:
+        """(Re)start ffmpeg so that the next frame read is frame_no; False if the video ends first."""
+        self._stop()
+        # Without a frame rate there is no -ss time for frame_no, so decode up to it
+        seek = frame_no > 0 and self.fps > 0
+        cmd = [self.ffmpeg, "-v", "error", "-nostdin"]
+        if seek:
+            cmd += ["-ss", f"{frame_no / self.fps:.6f}"]
+        cmd += ["-i", self.video_path, "-f", "rawvideo", "-pix_fmt", "yuv420p", "-"]
+        self._err = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=self._err,
+                                      bufsize=len(self._view))
+        self._pos = frame_no if seek else 0
+        while self._pos < frame_no:
+            if not self.grab():
+                return False
+        return True
+
+    def _stop(self) -> None:
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+        if self._err is not None:
+            self._err.close()
+            self._err = None
+
+    def _log_errors(self) -> None:
+        """Log what ffmpeg wrote to stderr once its output has ended; only the first call logs."""
+        if self._err is None:
+            return
+        self._proc.wait()
+        self._err.seek(0)
+        message = self._err.read().decode(errors="replace").strip()
+        self._err.close()
+        self._err = None
+        if message:
+            logger.error(f"ffmpeg: {message}")
+
+    def isOpened(self) -> bool:
+        return self._proc is not None
+
+    def grab(self) -> bool:
+        """Advance one frame, leaving it unconverted in the yuv buffer."""
+        if self._proc is None:
+            return False
+        filled = 0
+        while filled < len(self._view):
+            n = self._proc.stdout.readinto(self._view[filled:])
+            if not n:
+                self._log_errors()
+                return False
+            filled += n
+        self._pos += 1
+        return True
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        """Read the next frame as BGR, into image when it is given and fits."""
+        if not self.grab():
+            return False, None
+        return True, cv2.cvtColor(self._yuv, cv2.COLOR_YUV2BGR_I420, dst=image)
+
+    def get(self, prop_id: int) -> float:
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count)
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._pos)
+        return 0.0
+
+    def set(self, prop_id: int, value: float) -> bool:
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return self._start(max(int(value), 0))
+        return False
+
+    def release(self) -> None:
+        self._stop()
+
+
+def open_capture(video_path: str):
+    """Open video_path through ffmpeg when it is on PATH, else with cv2.VideoCapture."""
+    if shutil.which("ffmpeg"):
+        try:
+            return FFmpegYUVReader(video_path)
+        except (VideoLoadError, OSError) as e:
+            logger.warning(f"ffmpeg reader unavailable, using OpenCV capture: {e}")
+    return cv2.VideoCapture(video_path)
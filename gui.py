@@ -5,8 +5,8 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QThread
 from PyQt5.QtGui import QImage, QPixmap
-import cv2
 import numpy as np
+import time
 from typing import Optional, Tuple
 from loguru import logger
 from config import Config
@@ -14,7 +14,7 @@ import sys
 
 class VideoThread(QThread):
     """Thread for video processing to keep UI responsive."""
-    frame_ready = pyqtSignal(np.ndarray)
+    frame_ready = pyqtSignal(QImage)
     progress_update = pyqtSignal(int)
     error_occurred = pyqtSignal(str)
     
@@ -25,27 +25,41 @@ class VideoThread(QThread):
         self.base_fps = video_processor.fps if video_processor else 30
         self.fps = self.base_fps  # Current fps will be modified by speed control
         
+    @property
+    def fps(self) -> float:
+        """Target playback rate in frames per second."""
+        return self._fps
+        
+    @fps.setter
+    def fps(self, value: float):
+        self._fps = value
+        self._target_dt = 1.0 / value if value > 0 else 1.0 / 30  # Default to ~30fps if fps is 0
+        
     def run(self):
         """Main thread loop for video processing."""
         self.running = True
+        last_progress = -1
         try:
             while self.running:
+                t0 = time.perf_counter()
                 if not self.video_processor.process_next_frame():
                     logger.info("Reached end of video")
                     break
                     
                 frame = self.video_processor.current_frame
                 if frame is not None:
-                    # Convert BGR to RGB for Qt
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    self.frame_ready.emit(frame_rgb)
+                    self.frame_ready.emit(self.to_qimage(frame))
                     
+                # Only signal when the visible percentage changes
                 progress = int(self.video_processor.progress)
-                self.progress_update.emit(progress)
+                if progress != last_progress:
+                    last_progress = progress
+                    self.progress_update.emit(progress)
                 
-                # Control playback speed based on fps
-                delay = int(1000 / self.fps) if self.fps > 0 else 33  # Default to ~30fps if fps is 0
-                QThread.msleep(delay)
+                # Sleep only for what is left of this frame's time budget
+                sleep_ms = int((self._target_dt - (time.perf_counter() - t0)) * 1000)
+                if sleep_ms > 0:
+                    QThread.msleep(sleep_ms)
                 
         except Exception as e:
             logger.error(f"Error in video processing thread: {e}")
@@ -53,6 +67,17 @@ class VideoThread(QThread):
         finally:
             self.running = False
             
+    @staticmethod
+    def to_qimage(frame: np.ndarray) -> QImage:
+        """Wrap a BGR frame in a QImage that owns its pixel data."""
+        h, w = frame.shape[:2]
+        bytes_per_line = 3 * w
+        if hasattr(QImage, "Format_BGR888"):  # Qt >= 5.14
+            # copy() detaches from the ndarray before it is reused
+            return QImage(frame.data, w, h, bytes_per_line, QImage.Format_BGR888).copy()
+        # rgbSwapped() already returns a detached image
+        return QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888).rgbSwapped()
+            
     def stop(self):
         """Stop video processing."""
         self.running = False
@@ -65,10 +90,20 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.config = Config.load()
+        # Coalesce bursts of settings changes (e.g. spinbox drags) into one write
+        self._save_timer = QTimer(self)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(500)
+        # Through a lambda: the slotted Config has no __weakref__, which PyQt
+        # needs to connect a bound method directly
+        self._save_timer.timeout.connect(lambda: self.config.save())
         self.init_ui()
         self.video_thread: Optional[VideoThread] = None
         self.video_processor = None  # Will be initialized when video is loaded
         self.last_click_pos = None
+        # Display size cache, keyed on (label size, source frame size)
+        self._scale_key = None
+        self._scaled_size = None
         
     def init_ui(self):
         """Initialize the user interface."""
@@ -197,9 +232,19 @@ class MainWindow(QMainWindow):
             try:
                 # Initialize video processor
                 from video_processor import VideoProcessor
+                # Stop playback first: the thread may be inside process_next_frame
+                # on the old processor, and it stays bound to it, so drop it too
+                if self.video_thread:
+                    self.video_thread.stop()
+                    self.video_thread.deleteLater()
+                    self.video_thread = None
+                    self.play_btn.setText("Play")
+                if self.video_processor:
+                    self.video_processor.release()
                 self.video_processor = VideoProcessor(
                     frame_skip=self.config.frame_skip,
-                    buffer_size=self.config.buffer_size
+                    buffer_size=self.config.buffer_size,
+                    enable_threading=self.config.enable_threading
                 )
                 
                 # Open the video file
@@ -233,17 +278,17 @@ class MainWindow(QMainWindow):
     def update_speed_unit(self, unit):
         """Update speed unit configuration."""
         self.config.speed_unit = unit
-        self.config.save()
+        self._save_timer.start()
         
     def update_distance(self, value):
         """Update known distance configuration."""
         self.config.known_distance_m = value
-        self.config.save()
+        self._save_timer.start()
         
     def update_frame_skip(self, value):
         """Update frame skip configuration."""
         self.config.frame_skip = value
-        self.config.save()
+        self._save_timer.start()
         
     def update_playback_speed(self, value):
         """Update video playback speed."""
@@ -255,37 +300,35 @@ class MainWindow(QMainWindow):
     def update_buffer_size(self, value):
         """Update buffer size configuration."""
         self.config.buffer_size = value
-        self.config.save()
+        self._save_timer.start()
         
     def toggle_speed_display(self, state):
         """Toggle speed display configuration."""
         self.config.show_speed = bool(state)
-        self.config.save()
+        self._save_timer.start()
         
-    def update_frame(self, frame):
+    def update_frame(self, image):
         """Update video display with new frame."""
         try:
-            h, w = frame.shape[:2]
-            bytes_per_line = 3 * w
-            image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
             pixmap = QPixmap.fromImage(image)
             
-            # Get label size
-            label_size = self.video_label.size()
+            # Recompute the aspect-fit target only when the label or frame size changes
+            scale_key = (self.video_label.size(), pixmap.size())
+            if scale_key != self._scale_key:
+                self._scale_key = scale_key
+                self._scaled_size = pixmap.size().scaled(scale_key[0], Qt.KeepAspectRatio)
             
-            # Scale pixmap to fit label while maintaining aspect ratio
-            scaled_pixmap = pixmap.scaled(
-                label_size,
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
-            )
+            if pixmap.size() != self._scaled_size:
+                scaled_pixmap = pixmap.scaled(
+                    self._scaled_size,
+                    Qt.IgnoreAspectRatio,
+                    Qt.FastTransformation
+                )
+            else:
+                scaled_pixmap = pixmap
             
             self.video_label.setPixmap(scaled_pixmap)
             
-            # Update progress bar
-            progress = int(self.video_processor.progress)
-            self.progress_bar.setValue(progress)
-            
             # Update speed display
             self.update_speed_display()
             
@@ -345,6 +388,9 @@ class MainWindow(QMainWindow):
         """Handle application closure."""
         if self.video_thread:
             self.video_thread.stop()
+        if self.video_processor:
+            self.video_processor.release()
+        self._save_timer.stop()
         self.config.save()
         super().closeEvent(event)
 
@@ -4,17 +4,19 @@ import os
 
 def setup_logging(log_path: str = "logs") -> None:
     """Set up application logging configuration."""
-    if not os.path.exists(log_path):
-        os.makedirs(log_path)
+    os.makedirs(log_path, exist_ok=True)
 
     # Remove default logger
     logger.remove()
 
-    # Add console logger with colors
+    # Add plain console logger for warnings and errors; the debug file keeps the rest.
+    # enqueue=True formats and writes on loguru's worker thread, not the caller's.
     logger.add(
         sys.stderr,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-        level="INFO"
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {message}",
+        level="WARNING",
+        colorize=False,
+        enqueue=True
     )
 
     # Add file logger for debug information
@@ -23,7 +25,8 @@ def setup_logging(log_path: str = "logs") -> None:
         rotation="1 day",
         retention="7 days",
         format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level="DEBUG"
+        level="DEBUG",
+        enqueue=True
     )
 
     # Add file logger for errors only
@@ -32,5 +35,6 @@ def setup_logging(log_path: str = "logs") -> None:
         rotation="1 day",
         retention="30 days",
         format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level="ERROR"
+        level="ERROR",
+        enqueue=True
     )
\ No newline at end of file
@@ -1,3 +1,9 @@
+import os
+
+# Frame-parallel FFmpeg decoding for every capture the app opens; must be set
+# before the first cv2.VideoCapture. An explicit value in the environment wins.
+os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", f"threads;{os.cpu_count() or 1}|thread_type;frame")
+
 from gui import start_gui
 from logger import setup_logging
 from loguru import logger
@@ -21,6 +27,7 @@ if __name__ == "__main__":
 from detector import VehicleSpeedDetector
 from config import Config
 from exceptions import VideoLoadError, ModelLoadError, ConfigurationError, ProcessingError
+from ffmpeg_reader import open_capture
 from logger import setup_logging
 
 # --- File selection dialog ---
@@ -31,7 +38,12 @@ def select_video() -> Optional[str]:
     Returns:
         Optional[str]: Selected video file path or None if cancelled
     """
+    root = None
     try:
+        # Imported here so Tk is only loaded when the dialog is actually needed
+        import tkinter as tk
+        from tkinter import filedialog
+        
         root = tk.Tk()
         root.withdraw()
         file_path = filedialog.askopenfilename(
@@ -60,6 +72,9 @@ def select_video() -> Optional[str]:
     except Exception as e:
         logger.error(f"Error in file selection dialog: {e}")
         return None
+    finally:
+        if root is not None:
+            root.destroy()
 
 # --- Setup logging ---
 setup_logging()
@@ -81,12 +96,16 @@ if not video_path:
     raise VideoLoadError("No video file selected")
 
 try:
-    # --- Load video ---
-    cap = cv2.VideoCapture(video_path)
+    # --- Load video (ffmpeg yuv420p pipe when available) ---
+    cap = open_capture(video_path)
     if not cap.isOpened():
         raise VideoLoadError(f"Cannot open video file: {video_path}")
+    # Keep backend-side queuing to one frame so seeks and resumes are not served stale frames
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
     
     logger.info(f"Successfully loaded video: {video_path}")
+    if hasattr(cap, "getBackendName") and cap.getBackendName() != "FFMPEG":
+        logger.warning(f"Capture backend is {cap.getBackendName()}; FFmpeg decode threading does not apply")
 except Exception as e:
     logger.error(f"Failed to load video: {e}")
     raise VideoLoadError(f"Failed to load video: {e}")
@@ -111,20 +130,22 @@ def detect_fps(cap: cv2.VideoCapture) -> float:
             logger.info(f"FPS from metadata: {fps:.2f}")
             return fps
 
-        # Auto-detect FPS by sampling frames
+        # Auto-detect FPS from the container timestamps of a few frames;
+        # grab() advances without converting pixels and the result does not
+        # depend on how fast this machine decodes
         logger.warning("FPS metadata missing - auto-detecting FPS...")
-        frame_times = []
-        start_time = time.time()
-        
-        for _ in range(10):
-            ret, _ = cap.read()
-            if not ret:
+        sample_frames = 30
+        cap.grab()  # POS_MSEC is the timestamp of the last grabbed frame
+        start_msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+        grabbed = 0
+        for _ in range(sample_frames):
+            if not cap.grab():
                 break
-            frame_times.append(time.time())
+            grabbed += 1
+        elapsed_msec = cap.get(cv2.CAP_PROP_POS_MSEC) - start_msec
         
-        if len(frame_times) > 1:
-            frame_intervals = [t2 - t1 for t1, t2 in zip(frame_times[:-1], frame_times[1:])]
-            fps = 1 / (sum(frame_intervals) / len(frame_intervals))
+        if grabbed and elapsed_msec > 0:
+            fps = grabbed * 1000.0 / elapsed_msec
             logger.info(f"Auto-detected FPS: {fps:.2f}")
         else:
             fps = 30  # fallback
@@ -166,7 +187,7 @@ try:
     
     try:
         detector = VehicleSpeedDetector(known_distance_m)
-        detector.set_video_info(width, fps)
+        detector.set_video_info(width, fps, height)
         logger.info("Vehicle detector initialized successfully")
     except Exception as e:
         raise ModelLoadError(f"Failed to initialize vehicle detector: {e}")
@@ -182,7 +203,8 @@ cv2.setMouseCallback("Vehicle Speed Detector", detector.select_object)
 paused = False
 fullscreen = False
 frame_no = 0
-start_playback_time = None
+start_playback_ns = None  # time.monotonic_ns() at which frame 0 is due
+frame_period_ns = 1_000_000_000 / fps
 
 print("""
 🎮 CONTROLS:
@@ -215,12 +237,11 @@ def process_and_display_frame(frame: np.ndarray):
         )
         
         # Handle real-time synchronization
-        if start_playback_time is not None:
-            elapsed = time.time() - start_playback_time
-            expected_time = video_processor.current_frame_no / fps
-            diff = expected_time - elapsed
-            if diff > 0:
-                time.sleep(diff)
+        if start_playback_ns is not None:
+            expected_ns = start_playback_ns + int(video_processor.current_frame_no * frame_period_ns)
+            diff_ns = expected_ns - time.monotonic_ns()
+            if diff_ns > 1_000_000:  # Not worth a sleep below 1 ms
+                time.sleep(diff_ns * 1e-9)
                 
         display_frame(processed_frame)
         
@@ -235,8 +256,8 @@ video_processor = VideoProcessor(
 
 while True:
     if not paused:
-        if start_playback_time is None:
-            start_playback_time = time.time()
+        if start_playback_ns is None:
+            start_playback_ns = time.monotonic_ns()
             video_processor.start_processing(cap, process_and_display_frame)
     else:
         video_processor.stop_processing()
@@ -253,7 +274,7 @@ while True:
                 video_processor.stop_processing()
                 logger.info("Playback paused - click to select vehicle")
             else:
-                start_playback_time = time.time() - (video_processor.current_frame_no / fps)
+                start_playback_ns = time.monotonic_ns() - int(video_processor.current_frame_no * frame_period_ns)
                 video_processor.start_processing(cap, process_and_display_frame)
                 logger.info("Playback resumed")
                 
@@ -271,7 +292,7 @@ while True:
             cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
             video_processor.current_frame_no = 0
             detector.prev_center = None
-            start_playback_time = None
+            start_playback_ns = None
             video_processor.start_processing(cap, process_and_display_frame)
             logger.info("Video restarted")
             
@@ -1,39 +1,126 @@
+import math
 import cv2
 import numpy as np
 from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from collections import defaultdict
 import time
 from loguru import logger
+from utils import GlyphAtlas, njit
+
+
+@njit(cache=True, fastmath=True)
+def compute_speeds(cur, prev, dt, scale):
+    """Speed per row from consecutive centres and time steps; 0 where dt <= 0."""
+    out = np.zeros(len(dt))
+    for i in range(len(dt)):
+        if dt[i] > 0:
+            dx = (cur[i, 0] - prev[i, 0]) * scale
+            dy = (cur[i, 1] - prev[i, 1]) * scale
+            out[i] = math.sqrt(dx * dx + dy * dy) / dt[i]
+    return out
+
+
+class RingBuffer:
+    """Fixed-capacity history that overwrites its oldest entry once full."""
+    __slots__ = ("data", "head", "n")
+
+    def __init__(self, capacity: int, shape: Tuple[int, ...] = (), dtype=np.float64):
+        self.data = np.empty((capacity,) + shape, dtype)
+        self.head = 0  # Slot the next append writes to
+        self.n = 0     # Number of filled slots
+
+    def __len__(self) -> int:
+        return self.n
+
+    def append(self, value) -> None:
+        self.data[self.head] = value
+        self.head = (self.head + 1) % len(self.data)
+        if self.n < len(self.data):
+            self.n += 1
+
+    @property
+    def last(self):
+        return self.data[self.head - 1]
+
+    def values(self) -> np.ndarray:
+        """Filled slots oldest first."""
+        if self.n < len(self.data):
+            return self.data[:self.n]
+        return np.concatenate((self.data[self.head:], self.data[:self.head]))
+
+
+HISTORY_LENGTH = 64  # Samples of position/time/speed kept per track
+TRAIL_LENGTH = 20    # Points in the drawn track line
+
+# Character masks shared by all track labels
+_LABEL_GLYPHS = GlyphAtlas(cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2, charset="0123456789.-: /kmphIDAvg")
+
+# Fixed BGR colours handed out by vehicle id, the same on every run
+_PALETTE = [tuple(c) for c in np.random.RandomState(0).randint(32, 255, (256, 3)).tolist()]
+
 
 @dataclass
 class VehicleTrack:
     """Represents a tracked vehicle and its speed measurements."""
     id: int
-    positions: List[Tuple[float, float]]  # List of (x, y) positions
-    timestamps: List[float]  # List of timestamps for each position
-    speeds: List[float]  # List of calculated speeds
-    last_update: float  # Last update timestamp
+    last_update: int  # Last update, time.monotonic_ns()
     color: Tuple[int, int, int]  # BGR color for visualization
+    # Recent (x, y) positions, their timestamps and the calculated speeds
+    positions: RingBuffer = field(default_factory=lambda: RingBuffer(HISTORY_LENGTH, (2,), np.float32))
+    timestamps: RingBuffer = field(default_factory=lambda: RingBuffer(HISTORY_LENGTH, dtype=np.int64))
+    speeds: RingBuffer = field(default_factory=lambda: RingBuffer(HISTORY_LENGTH, dtype=np.float32))
+    # Track line as int32 points in cv2.polylines layout. Every point is written
+    # twice, TRAIL_LENGTH apart, so the last TRAIL_LENGTH points are always the
+    # contiguous, oldest-first slice ending at _trail_head + TRAIL_LENGTH.
+    _trail: np.ndarray = field(default_factory=lambda: np.zeros((2 * TRAIL_LENGTH, 1, 2), np.int32),
+                               init=False, repr=False)
+    _trail_head: int = field(default=0, init=False, repr=False)
+    # Running statistics over every speed sample, not just the retained history
+    _sum_speed: float = field(default=0.0, init=False, repr=False)
+    _max_speed: float = field(default=0.0, init=False, repr=False)
+    _n_speed: int = field(default=0, init=False, repr=False)
+    
+    def add_position(self, center, timestamp: int) -> None:
+        """Record a new centre and its time."""
+        self.positions.append(center)
+        self.timestamps.append(timestamp)
+        head = self._trail_head
+        self._trail[head, 0] = self._trail[head + TRAIL_LENGTH, 0] = center
+        self._trail_head = (head + 1) % TRAIL_LENGTH
+        
+    def add_speed(self, speed: float) -> None:
+        """Record a new speed sample."""
+        self.speeds.append(speed)
+        self._sum_speed += speed
+        if speed > self._max_speed:
+            self._max_speed = speed
+        self._n_speed += 1
+        
+    @property
+    def trail(self) -> np.ndarray:
+        """Most recent points of the track line, oldest first."""
+        head = self._trail_head
+        return self._trail[head + TRAIL_LENGTH - min(len(self.positions), TRAIL_LENGTH):head + TRAIL_LENGTH]
     
     @property
     def current_speed(self) -> Optional[float]:
         """Get the current speed of the vehicle."""
-        return self.speeds[-1] if self.speeds else None
+        return float(self.speeds.last) if self.speeds.n else None
         
     @property
     def average_speed(self) -> Optional[float]:
         """Get the average speed of the vehicle."""
-        return np.mean(self.speeds) if self.speeds else None
+        return self._sum_speed / self._n_speed if self._n_speed else None
         
     @property
     def max_speed(self) -> Optional[float]:
         """Get the maximum speed of the vehicle."""
-        return max(self.speeds) if self.speeds else None
+        return self._max_speed if self._n_speed else None
         
     def is_active(self, timeout: float = 1.0) -> bool:
         """Check if the track is still active based on last update time."""
-        return (time.time() - self.last_update) < timeout
+        return (time.monotonic_ns() - self.last_update) < timeout * 1e9
 
 
 class MultiVehicleTracker:
@@ -44,65 +131,84 @@ class MultiVehicleTracker:
         self.vehicles: Dict[int, VehicleTrack] = {}
         self.max_disappeared = max_disappeared
         self.speed_unit = "km/h"
+        self.match_distance = 50.0  # Max centre shift (px) to continue a track
+        self.track_timeout = 1.0    # Seconds without a match before a track is dropped
+        self.speed_scale = 1.0      # Multiplier from px/s to the displayed speed unit
+        # Row-aligned views of the live tracks for vectorised matching
+        self._ids: List[int] = []
+        self._last_pos = np.empty((0, 2), np.float32)
+        self._last_seen = np.empty(0, np.int64)  # time.monotonic_ns() of the last match
         
     def update(self, detections: List[Tuple[int, int, int, int]], frame: np.ndarray) -> np.ndarray:
         """Update vehicle tracks with new detections."""
-        current_time = time.time()
+        # Monotonic clock so wall-clock adjustments cannot corrupt dt
+        current_time = time.monotonic_ns()
+        timeout_ns = self.track_timeout * 1e9
         
-        # Create new tracks or update existing ones
-        matched_tracks = set()
-        for bbox in detections:
-            x, y, w, h = bbox
-            center = (x + w/2, y + h/2)
-            
-            # Find closest existing track
-            closest_id = None
-            min_dist = float('inf')
-            for vid, track in self.vehicles.items():
-                if not track.is_active():
+        det = np.asarray(detections, dtype=np.float32).reshape(-1, 4)
+        centers = det[:, :2] + det[:, 2:] / 2
+        
+        # Match detections to active tracks from one distance matrix
+        matched = np.empty(0, np.intp)
+        rows = np.empty(0, np.intp)
+        if len(centers) and len(self._ids):
+            diff = centers[:, None, :] - self._last_pos[None, :, :]
+            d2 = np.einsum('ijk,ijk->ij', diff, diff)
+            d2[:, (current_time - self._last_seen) >= timeout_ns] = np.inf
+            # Greedy assignment over all pairs in range, closest first, so a
+            # detection that loses its nearest track can still take the next one
+            det_idx, track_idx = np.nonzero(d2 < self.match_distance ** 2)
+            order = np.argsort(d2[det_idx, track_idx], kind="stable")
+            used_det, used_track = set(), set()
+            pairs = []
+            for i, row in zip(det_idx[order].tolist(), track_idx[order].tolist()):
+                if i in used_det or row in used_track:
                     continue
-                if track.positions:
-                    dist = np.linalg.norm(np.array(center) - np.array(track.positions[-1]))
-                    if dist < min_dist and dist < 50:  # threshold for matching
-                        min_dist = dist
-                        closest_id = vid
-                        
-            if closest_id is not None:
-                # Update existing track
-                track = self.vehicles[closest_id]
-                track.positions.append(center)
-                track.timestamps.append(current_time)
+                used_det.add(i)
+                used_track.add(row)
+                pairs.append((i, row))
+            if pairs:
+                matched, rows = (np.array(v, np.intp) for v in zip(*pairs))
+            
+        if len(matched):
+            # Speeds for all continued tracks at once
+            dt = (current_time - self._last_seen[rows]) * 1e-9
+            speeds = compute_speeds(centers[matched], self._last_pos[rows], dt, self.speed_scale)
+            
+            for i, row, speed, ok in zip(matched.tolist(), rows.tolist(), speeds.tolist(), (dt > 0).tolist()):
+                track = self.vehicles[self._ids[row]]
+                track.add_position(centers[i], current_time)
                 track.last_update = current_time
-                
-                # Calculate speed
-                if len(track.positions) >= 2:
-                    dt = track.timestamps[-1] - track.timestamps[-2]
-                    if dt > 0:
-                        dx = track.positions[-1][0] - track.positions[-2][0]
-                        dy = track.positions[-1][1] - track.positions[-2][1]
-                        speed = np.sqrt(dx*dx + dy*dy) / dt
-                        track.speeds.append(speed)
-                
-                matched_tracks.add(closest_id)
-            else:
-                # Create new track
-                color = tuple(np.random.randint(0, 255, 3).tolist())
-                self.vehicles[self.next_vehicle_id] = VehicleTrack(
+                if ok:
+                    track.add_speed(speed)
+                    
+            self._last_pos[rows] = centers[matched]
+            self._last_seen[rows] = current_time
+            
+        # Create new tracks for unmatched detections
+        unmatched = np.setdiff1d(np.arange(len(centers)), matched)
+        if len(unmatched):
+            for center in centers[unmatched]:
+                track = VehicleTrack(
                     id=self.next_vehicle_id,
-                    positions=[center],
-                    timestamps=[current_time],
-                    speeds=[],
                     last_update=current_time,
-                    color=color
+                    color=_PALETTE[self.next_vehicle_id & 0xFF]
                 )
-                matched_tracks.add(self.next_vehicle_id)
+                track.add_position(center, current_time)
+                self.vehicles[self.next_vehicle_id] = track
+                self._ids.append(self.next_vehicle_id)
                 self.next_vehicle_id += 1
+            self._last_pos = np.concatenate((self._last_pos, centers[unmatched]))
+            self._last_seen = np.concatenate((self._last_seen, np.full(len(unmatched), current_time, np.int64)))
                 
         # Remove inactive tracks
-        self.vehicles = {
-            vid: track for vid, track in self.vehicles.items()
-            if track.is_active() or vid in matched_tracks
-        }
+        keep = (current_time - self._last_seen) < timeout_ns
+        if not keep.all():
+            for vid in np.asarray(self._ids)[~keep].tolist():
+                del self.vehicles[vid]
+            self._ids = np.asarray(self._ids)[keep].tolist()
+            self._last_pos = self._last_pos[keep]
+            self._last_seen = self._last_seen[keep]
         
         # Draw tracks and speeds on frame
         return self.draw_tracks(frame)
@@ -110,27 +216,24 @@ class MultiVehicleTracker:
     def draw_tracks(self, frame: np.ndarray) -> np.ndarray:
         """Draw vehicle tracks and speed information on the frame."""
         for track in self.vehicles.values():
-            if not track.is_active():
+            if not track.is_active(self.track_timeout):
                 continue
                 
             # Draw track line
             if len(track.positions) > 1:
-                points = np.array(track.positions[-20:], dtype=np.int32)
-                cv2.polylines(frame, [points], False, track.color, 2)
+                cv2.polylines(frame, [track.trail], False, track.color, 2)
                 
             # Draw current position and speed
             if track.positions:
-                x, y = map(int, track.positions[-1])
+                x, y = map(int, track.positions.last)
                 if track.current_speed is not None:
                     speed_text = f"{track.current_speed:.1f} {self.speed_unit}"
-                    cv2.putText(frame, speed_text, (x, y),
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.6, track.color, 2)
+                    _LABEL_GLYPHS.draw(frame, speed_text, x, y, track.color)
                               
             # Draw ID and average speed
             if track.average_speed is not None:
                 avg_text = f"ID: {track.id} Avg: {track.average_speed:.1f} {self.speed_unit}"
-                cv2.putText(frame, avg_text, (x, y - 20),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, track.color, 2)
+                _LABEL_GLYPHS.draw(frame, avg_text, x, y - 20, track.color)
                            
         return frame
         
@@ -154,9 +257,9 @@ class MultiVehicleTracker:
         """Export tracking data for all vehicles."""
         return {
             vid: {
-                "positions": track.positions,
-                "timestamps": track.timestamps,
-                "speeds": track.speeds,
+                "positions": track.positions.values().tolist(),
+                "timestamps": (track.timestamps.values() * 1e-9).tolist(),
+                "speeds": track.speeds.values().tolist(),
                 "average_speed": track.average_speed,
                 "max_speed": track.max_speed
             }
@@ -1,12 +1,32 @@
 import cv2
+import numpy as np
+from functools import lru_cache
 
-def display_frame(frame):
-    """Display resized frame."""
+@lru_cache(maxsize=8)
+def _display_size(frame_w, frame_h):
+    """Aspect-preserving size that fits the frame into the display window."""
     screen_res = (1280, 720)
-    frame_h, frame_w = frame.shape[:2]
     scale = min(screen_res[0] / frame_w, screen_res[1] / frame_h)
-    new_w, new_h = int(frame_w * scale), int(frame_h * scale)
-    disp_frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    return int(frame_w * scale), int(frame_h * scale)
+
+def display_frame(frame, stream=None):
+    """Display resized frame.
+
+    frame may be a numpy array or a cv2.cuda_GpuMat; a GPU frame is resized
+    on the device and only the display-sized result is downloaded.
+    """
+    if isinstance(frame, np.ndarray):
+        frame_h, frame_w = frame.shape[:2]
+        disp_frame = cv2.resize(frame, _display_size(frame_w, frame_h), interpolation=cv2.INTER_AREA)
+    else:
+        frame_w, frame_h = frame.size()
+        new_w, new_h = _display_size(frame_w, frame_h)
+        # CUDA INTER_AREA only supports downscaling
+        interpolation = cv2.INTER_AREA if new_w <= frame_w else cv2.INTER_LINEAR
+        stream = stream or cv2.cuda.Stream_Null()
+        gpu_disp = cv2.cuda.resize(frame, (new_w, new_h), interpolation=interpolation, stream=stream)
+        disp_frame = gpu_disp.download(stream)
+        stream.waitForCompletion()
     cv2.imshow("Vehicle Speed Detector", disp_frame)
 
 def print_controls():
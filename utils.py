@@ -1,5 +1,12 @@
 # utils.py
 import cv2
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to plain Python
+    def njit(*args, **kwargs):
+        return lambda fn: fn
 
 def draw_fps(frame, fps, frame_no, total_frames):
     height, width = frame.shape[:2]
@@ -8,3 +15,134 @@ def draw_fps(frame, fps, frame_no, total_frames):
     cv2.putText(frame, f"Frame: {frame_no}/{total_frames}", (width - 250, height - 20),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
     return frame
+
+
+def blit(frame, sprite, x, y, mask=None):
+    """Copy sprite into frame with its top-left corner at (x, y), clipped to the frame.
+
+    If mask is given, only pixels where it is True are copied.
+    """
+    h, w = sprite.shape[:2]
+    frame_h, frame_w = frame.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, frame_w), min(y + h, frame_h)
+    if x0 < x1 and y0 < y1:
+        src = sprite[y0 - y:y1 - y, x0 - x:x1 - x]
+        if mask is None:
+            frame[y0:y1, x0:x1] = src
+        else:
+            np.copyto(frame[y0:y1, x0:x1], src, where=mask[y0 - y:y1 - y, x0 - x:x1 - x, None])
+    return frame
+
+
+def render_text(text, font_face, font_scale, thickness, color):
+    """Rasterise text once for later blitting.
+
+    Returns (sprite, mask, origin) where origin is the (x, y) offset of the
+    cv2.putText anchor point inside the sprite.
+    """
+    (w, h), baseline = cv2.getTextSize(text, font_face, font_scale, thickness)
+    pad = thickness
+    mask = np.zeros((h + baseline + 2 * pad, w + 2 * pad), np.uint8)
+    cv2.putText(mask, text, (pad, h + pad), font_face, font_scale, 255, thickness)
+    mask = mask > 0
+    sprite = np.zeros(mask.shape + (3,), np.uint8)
+    sprite[mask] = color
+    return sprite, mask, (pad, h + pad)
+
+
+class GlyphCache:
+    """Pre-rendered character sprites for overlay text that changes every frame.
+
+    Each character is rasterised once onto a solid background strip; labels
+    are built by concatenating strips and copied into the frame, so the font
+    is not re-rendered per frame.
+    """
+
+    def __init__(self, font_face, font_scale, thickness, color, background=(0, 0, 0), padding=5):
+        self.font_face = font_face
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self.color = color
+        self.background = background
+        self.padding = padding
+        (_, text_h), _ = cv2.getTextSize("0123456789kmph/", font_face, font_scale, thickness)
+        self.height = text_h + 2 * padding
+        self._pad = self._strip(padding)
+        self._glyphs = {}
+
+    def _strip(self, width):
+        strip = np.empty((self.height, width, 3), np.uint8)
+        strip[:] = self.background
+        return strip
+
+    def glyph(self, ch):
+        """Return the sprite for a single character, rendering it on first use."""
+        sprite = self._glyphs.get(ch)
+        if sprite is None:
+            (w, _), _ = cv2.getTextSize(ch, self.font_face, self.font_scale, self.thickness)
+            sprite = self._strip(w)
+            cv2.putText(sprite, ch, (0, self.height - self.padding), self.font_face,
+                        self.font_scale, self.color, self.thickness, cv2.LINE_AA)
+            self._glyphs[ch] = sprite
+        return sprite
+
+    def render(self, text):
+        """Assemble a padded label sprite for text."""
+        return np.hstack([self._pad] + [self.glyph(ch) for ch in text] + [self._pad])
+
+    def draw(self, frame, text, x, y):
+        """Draw text on its background box with the box's bottom-left corner at (x, y)."""
+        return blit(frame, self.render(text), x, y - self.height)
+
+
+class GlyphAtlas:
+    """Pre-rendered character masks for transparent overlay text in any colour.
+
+    Masks do not depend on colour, so one atlas serves every track; a label
+    is its character masks OR-ed together at their advance offsets and then
+    filled with the label colour.
+    """
+
+    def __init__(self, font_face, font_scale, thickness, charset=""):
+        self.font_face = font_face
+        self.font_scale = font_scale
+        self.thickness = thickness
+        (_, text_h), baseline = cv2.getTextSize("0123456789kmph/", font_face, font_scale, thickness)
+        self.pad = thickness
+        self.ascent = text_h + thickness  # Baseline row inside a glyph mask
+        self.height = text_h + baseline + 2 * thickness
+        self._glyphs = {}
+        for ch in charset:
+            self.glyph(ch)
+
+    def glyph(self, ch):
+        """Return (mask, advance) for a single character, rendering it on first use."""
+        glyph = self._glyphs.get(ch)
+        if glyph is None:
+            size = lambda t: cv2.getTextSize(t, self.font_face, self.font_scale, self.thickness)[0][0]
+            w = size(ch)
+            mask = np.zeros((self.height, w + 2 * self.pad), np.uint8)
+            cv2.putText(mask, ch, (self.pad, self.ascent), self.font_face, self.font_scale, 255, self.thickness)
+            # Fractional advance, as putText accumulates it across a string
+            glyph = (mask > 0, (size(ch * 16) - w) / 15)
+            self._glyphs[ch] = glyph
+        return glyph
+
+    def render(self, text):
+        """Assemble the mask for text; column pad is the text origin."""
+        glyphs = [self.glyph(ch) for ch in text]
+        width = round(sum(adv for _, adv in glyphs[:-1])) + glyphs[-1][0].shape[1] if glyphs else 0
+        out = np.zeros((self.height, width), bool)
+        pen = 0.0
+        for mask, adv in glyphs:
+            x = round(pen)
+            out[:, x:x + mask.shape[1]] |= mask
+            pen += adv
+        return out
+
+    def draw(self, frame, text, x, y, color):
+        """Draw text like cv2.putText, with its baseline starting at (x, y)."""
+        mask = self.render(text)
+        fill = np.broadcast_to(np.asarray(color, frame.dtype), mask.shape + (3,))
+        return blit(frame, fill, x - self.pad, y - self.ascent, mask)
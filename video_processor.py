@@ -1,44 +1,156 @@
+import os
 import cv2
 import numpy as np
-from threading import Thread, Lock, Event
-from queue import Queue
+from threading import Thread, Event
 from typing import Optional, Tuple, List
 from loguru import logger
-from PyQt5.QtCore import QThread  # Import QThread for sleep functionality
+
+def _open_capture(video_path: str) -> cv2.VideoCapture:
+    """Open video_path with hardware-accelerated FFmpeg decoding if possible, else in software."""
+    hw_accel = getattr(cv2, "VIDEO_ACCELERATION_ANY", None)  # OpenCV >= 4.5.2
+    if hw_accel is not None:
+        cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_HW_ACCELERATION, hw_accel])
+        if cap.isOpened():
+            if cap.get(cv2.CAP_PROP_HW_ACCELERATION) == cv2.VIDEO_ACCELERATION_NONE:
+                logger.debug("No hardware decoder available, decoding in software")
+            return cap
+        cap.release()
+    return cv2.VideoCapture(video_path)
+
+
+def _pin_current_thread(cpu: Optional[int]):
+    """Restrict the calling thread to one CPU; a no-op off Linux or when cpu is None."""
+    if cpu is None or not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except OSError as e:
+        logger.debug(f"Could not pin thread to CPU {cpu}: {e}")
+
+
+_cores_reserved = False  # Set once _reserve_cores has sized OpenCV's pool for this process
+
+
+def _reserve_cores(cv_threads: int):
+    """Size OpenCV's pool to cv_threads and create its workers from this (unpinned) thread; once per process.
+
+    OpenCV spawns its workers lazily on the first parallel call; if that call
+    came from a pinned thread every worker would inherit its single-CPU
+    affinity. A full-HD resize is large enough to go parallel.
+    """
+    global _cores_reserved
+    if _cores_reserved:
+        return
+    _cores_reserved = True
+    cv2.setNumThreads(cv_threads)
+    cv2.resize(np.zeros((1080, 1920, 3), np.uint8), (960, 540), interpolation=cv2.INTER_AREA)
+
 
 class FrameBuffer:
-    """Thread-safe frame buffer for video processing."""
+    """Single-producer/single-consumer ring buffer of decoded frames.
+
+    head and tail are ever-increasing sequence numbers (slot = seq % size):
+    only the reader thread writes head and only the processing thread writes
+    tail, and each side just reads the other's, so no lock is needed (element
+    stores are atomic under the GIL). The fill level is head - tail. Both live
+    in one int64 array, 128 bytes apart, so the two threads' writes never
+    share a cache line.
+
+    Each slot keeps its frame array after it is consumed and hands it back
+    through spare(), so the reader can decode into it in place. A slot stays
+    owned by the consumer from peek() until release().
+    """
+    
+    _HEAD = 0   # Index of head in _seq
+    _TAIL = 16  # Index of tail in _seq
+    
+    __slots__ = ("size", "frames", "numbers", "_seq", "high_water",
+                 "not_full", "not_empty", "stop_event", "processing_done")
     
     def __init__(self, max_size: int = 120):  # Increased buffer size for smoother playback
-        self.buffer = Queue(maxsize=max_size)
-        self.lock = Lock()
+        self.size = max_size
+        self.frames: List[Optional[np.ndarray]] = [None] * self.size  # Per-slot frame storage
+        self.numbers = [0] * self.size  # Frame number held by each slot
+        # [head, padding..., tail, padding...]: sequence numbers of the next
+        # frame put and the next frame taken
+        self._seq = np.zeros(32, np.int64)
+        self.high_water = max(int(max_size * 0.9), 1)  # Producer pauses at this fill level
+        self.not_full = Event()  # Set by the consumer once the fill drops below high_water
+        self.not_empty = Event()  # Set by the producer after each put
         self.stop_event = Event()
         self.processing_done = Event()  # New event for synchronization
         
+    def __len__(self) -> int:
+        return int(self._seq[self._HEAD] - self._seq[self._TAIL])
+        
     def clear(self):
-        """Clear all frames from buffer."""
-        with self.lock:
-            while not self.buffer.empty():
-                self.buffer.get()
+        """Drop all buffered frames, keeping their storage; only call while neither thread is running."""
+        self._seq[:] = 0
+        
+    def spare(self) -> Optional[np.ndarray]:
+        """Storage of the slot the next put() fills, to decode into; None until first used."""
+        return self.frames[self._seq[self._HEAD] % self.size]
                 
-    def put(self, frame: np.ndarray) -> bool:
+    def put(self, frame_no: int, frame: np.ndarray) -> bool:
         """Add frame to buffer if not full."""
-        try:
-            self.buffer.put(frame, block=False)
-            return True
-        except:
+        seq = self._seq
+        head = seq[self._HEAD]
+        if head - seq[self._TAIL] >= self.size:
             return False
+        slot = head % self.size
+        self.frames[slot] = frame
+        self.numbers[slot] = frame_no
+        seq[self._HEAD] = head + 1
+        self.not_empty.set()
+        return True
             
-    def get(self) -> Optional[np.ndarray]:
-        """Get frame from buffer if available."""
-        try:
-            return self.buffer.get(block=False)
-        except:
-            return None
+    def peek(self, count: int = 1) -> List[Tuple[int, np.ndarray]]:
+        """Up to count oldest (frame_no, frame) pairs, left in place until release()."""
+        seq = self._seq
+        tail = int(seq[self._TAIL])
+        end = min(int(seq[self._HEAD]), tail + count)
+        return [(self.numbers[i % self.size], self.frames[i % self.size]) for i in range(tail, end)]
+        
+    def release(self, count: int = 1):
+        """Hand the slots returned by peek() back to the producer."""
+        seq = self._seq
+        seq[self._TAIL] = tail = seq[self._TAIL] + count
+        if seq[self._HEAD] - tail < self.high_water:
+            self.not_full.set()
+        
+    def wait_below_high_water(self, timeout: float = 0.1):
+        """Block the producer while the ring is at or above its high-water mark."""
+        if len(self) < self.high_water:
+            return
+        self.not_full.clear()
+        # Re-check after clearing so a release() in between is not missed
+        if len(self) >= self.high_water and not self.should_stop:
+            self.not_full.wait(timeout)
+            
+    def wait_for_frame(self, timeout: float = 0.1):
+        """Block the consumer while the ring is empty."""
+        if len(self):
+            return
+        self.not_empty.clear()
+        # Re-check after clearing so a put() in between is not missed
+        if not len(self) and not self.should_stop and not self.processing_done.is_set():
+            self.not_empty.wait(timeout)
             
+    def finish(self):
+        """Signal that the producer has reached the end of the video."""
+        self.processing_done.set()
+        self.not_empty.set()
+        
     def stop(self):
         """Signal to stop processing."""
         self.stop_event.set()
+        self.not_full.set()
+        self.not_empty.set()
+        
+    def reset(self):
+        """Clear the stop and end-of-video flags so the buffer can be reused."""
+        self.stop_event.clear()
+        self.processing_done.clear()
         
     @property
     def should_stop(self) -> bool:
@@ -48,70 +160,140 @@ class FrameBuffer:
 class VideoProcessor:
     """Multi-threaded video processor with frame buffering."""
     
-    def __init__(self, frame_skip: int = 1, buffer_size: int = 120):  # Increased default buffer size
+    __slots__ = ("frame_skip", "batch_size", "seek_skip_frames", "buffer_size", "enable_threading",
+                 "frame_buffer", "read_thread", "process_thread", "_stream_cap", "current_frame_no",
+                 "total_frames", "_inv_total", "fps", "current_frame", "cap", "detector", "current_speed",
+                 "max_display_width", "_display_size", "_display_buf", "_display_step",
+                 "_prefetch", "_prefetch_thread", "_prefetch_held", "_reader_cpu", "_processor_cpu")
+    
+    def __init__(self, frame_skip: int = 1, buffer_size: int = 120, enable_threading: bool = True,
+                 batch_size: int = 1):  # Increased default buffer size
         self.frame_skip = frame_skip
+        self.batch_size = batch_size  # Frames per process_fn call in start_processing
+        self.seek_skip_frames = 30  # Skips at least this long seek instead of grabbing through
+        self.buffer_size = buffer_size
+        self.enable_threading = enable_threading
         self.frame_buffer = FrameBuffer(max_size=buffer_size)
         self.read_thread: Optional[Thread] = None
         self.process_thread: Optional[Thread] = None
+        self._stream_cap = None  # Capture being read by start_processing
         self.current_frame_no = 0
         self.total_frames = 0
+        self._inv_total = 0.0  # 1 / total_frames, for progress
         self.fps = 0
         self.current_frame = None
         self.cap = None
         self.detector = None
         self.current_speed = None
+        self.max_display_width = 1280  # Wider videos are processed and shown downscaled
+        self._display_size: Optional[Tuple[int, int]] = None  # (w, h) when downscaling
+        self._display_buf: Optional[np.ndarray] = None
+        self._display_step = 0  # Integer downscale factor, 0 when it is not a whole number
+        # Background decode for process_next_frame
+        self._prefetch: Optional[FrameBuffer] = None
+        self._prefetch_thread: Optional[Thread] = None
+        self._prefetch_held = False  # The ring's oldest slot is peeked but not yet released
+        # With enough cores, OpenCV's pool is sized once per process to leave
+        # two CPUs free, and start_processing pins its reader and processor
+        # threads to them (process_next_frame's decode thread is not pinned)
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        if len(cpus) >= 4:
+            self._reader_cpu, self._processor_cpu = cpus[-1], cpus[-2]
+            _reserve_cores(len(cpus) - 2)
+        else:
+            self._reader_cpu = self._processor_cpu = None
         
     def start_processing(self, cap: cv2.VideoCapture, process_fn):
-        """Start video processing threads."""
-        self.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.fps = cap.get(cv2.CAP_PROP_FPS)
-        
-        # Set OpenCV buffer size
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 3)  # Minimum buffer size for efficient reading
+        """Start video processing threads.
+
+        The reader decodes ahead of the processor into the frame buffer;
+        current_frame_no tracks the last frame handed to process_fn, and
+        stop_processing rewinds the capture there so a restart resumes
+        without skipping the frames that were still buffered.
+
+        Frames are decoded into reused buffers: process_fn must copy a frame
+        if it keeps a reference after returning. With batch_size > 1,
+        process_fn gets a list of up to batch_size frames that were already
+        decoded, oldest first, and current_frame_no is the last of them.
+        """
+        if cap is not self.cap and cap is not self._stream_cap:
+            # Not opened through open_video or already started: read its properties once
+            self._set_stream_info(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), cap.get(cv2.CAP_PROP_FPS))
+        self._stream_cap = cap
+        self.frame_buffer.reset()
         
         def read_frames():
             """Thread function to read frames from video."""
-            frames_to_skip = 0
+            _pin_current_thread(self._reader_cpu)
+            frame_no = self.current_frame_no
+            # Hot attributes bound once for the loop
+            buf = self.frame_buffer
+            stopped, high_water = buf.stop_event.is_set, buf.high_water
+            wait_space, spare, put = buf.wait_below_high_water, buf.spare, buf.put
+            read, grab = cap.read, cap.grab
+            skip, seek_skip = self.frame_skip, self.seek_skip_frames
             
-            while not self.frame_buffer.should_stop:
-                if self.frame_buffer.buffer.qsize() >= self.frame_buffer.buffer.maxsize * 0.9:
-                    # Buffer almost full, wait a bit
-                    QThread.msleep(10)
+            while not stopped():
+                if len(buf) >= high_water:
+                    # Buffer almost full, wait for the processor to catch up
+                    wait_space()
                     continue
                     
-                ret, frame = cap.read()
+                # Move to the next kept frame (a multiple of frame_skip)
+                # without converting the ones in between: grab() small gaps,
+                # seek over large ones
+                gap = -(frame_no + 1) % skip
+                if gap >= seek_skip:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no + gap)
+                    frame_no += gap
+                else:
+                    while gap and grab():
+                        frame_no += 1
+                        gap -= 1
+                    
+                # Decode in place into the next slot's array once it has one
+                ret, frame = read(spare())
                 if not ret:
                     logger.info("Reached end of video")
-                    self.frame_buffer.processing_done.set()
+                    buf.finish()
                     break
                     
-                self.current_frame_no += 1
-                
-                # Implement dynamic frame skipping
-                if frames_to_skip > 0:
-                    frames_to_skip -= 1
-                    continue
-                    
-                # Skip frames if needed
-                if self.current_frame_no % self.frame_skip != 0:
-                    continue
+                frame_no += 1
                     
-                if not self.frame_buffer.put(frame):
-                    frames_to_skip = self.frame_skip  # Skip next batch if buffer full
-                    logger.debug("Frame buffer full, implementing dynamic skip")
+                # Cannot fail: the wait above keeps the ring below full
+                put(frame_no, frame)
                     
         def process_frames():
             """Thread function to process buffered frames."""
-            while not (self.frame_buffer.should_stop and self.frame_buffer.processing_done.is_set() and self.frame_buffer.buffer.empty()):
-                frame = self.frame_buffer.get()
-                if frame is None:
-                    QThread.msleep(1)  # Small sleep to prevent busy waiting
-                    continue
+            _pin_current_thread(self._processor_cpu)
+            batch_size = self.batch_size
+            # Hot attributes bound once for the loop
+            buf = self.frame_buffer
+            stopped, done = buf.stop_event.is_set, buf.processing_done.is_set
+            peek, release, wait_frame = buf.peek, buf.release, buf.wait_for_frame
+            
+            while not stopped():
+                items = peek(batch_size)
+                if not items:
+                    if done():
+                        # finish() follows the last put(), so look once more
+                        items = peek(batch_size)
+                        if not items:
+                            break  # End of video and buffer drained
+                    else:
+                        wait_frame()
+                        continue
                     
+                self.current_frame_no = items[-1][0]
                 try:
-                    process_fn(frame)
+                    if batch_size == 1:
+                        process_fn(items[0][1])
+                    else:
+                        process_fn([frame for _, frame in items])
                 except Exception as e:
                     logger.error(f"Error processing frame: {e}")
+                finally:
+                    release(len(items))
                     
         # Start threads
         self.read_thread = Thread(target=read_frames)
@@ -122,6 +304,8 @@ class VideoProcessor:
         
     def stop_processing(self):
         """Stop video processing threads."""
+        if self.read_thread is None and self.process_thread is None:
+            return  # Already stopped, e.g. repeated calls while paused
         self.frame_buffer.stop()
         
         if self.read_thread:
@@ -129,40 +313,96 @@ class VideoProcessor:
             
         if self.process_thread:
             self.process_thread.join()
+        self.read_thread = self.process_thread = None
             
+        # Drop frames decoded ahead and rewind to the last processed one;
+        # both threads are joined, so the ring is reset without any locking
+        cap = self._stream_cap
+        if cap is not None and cap.get(cv2.CAP_PROP_POS_FRAMES) != self.current_frame_no:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.current_frame_no)
         self.frame_buffer.clear()
         
+    def _set_stream_info(self, total_frames: int, fps: float):
+        """Store the capture's frame count and rate."""
+        self.total_frames = total_frames
+        self._inv_total = 1.0 / total_frames if total_frames > 0 else 0.0
+        self.fps = fps
+        
     @property
     def progress(self) -> float:
         """Get current progress as percentage."""
-        return (self.current_frame_no / self.total_frames) * 100 if self.total_frames > 0 else 0
+        return self.current_frame_no * self._inv_total * 100
+        
+    def _start_prefetch(self):
+        """Start decoding frames ahead of process_next_frame into a frame ring."""
+        self._prefetch = FrameBuffer(max_size=self.buffer_size)
+        self._prefetch_held = False
+        self._prefetch_thread = Thread(target=self._decode_loop, args=(self.cap, self._prefetch), daemon=True)
+        self._prefetch_thread.start()
+        
+    def _decode_loop(self, cap: cv2.VideoCapture, frames: FrameBuffer):
+        """Thread function to decode frames in place; finish() marks the end of the video."""
+        frame_no = 0
+        while not frames.should_stop:
+            if len(frames) >= frames.high_water:
+                frames.wait_below_high_water()
+                continue
+            ret, frame = cap.read(frames.spare())
+            if not ret:
+                frames.finish()
+                break
+            frame_no += 1
+            frames.put(frame_no, frame)
+                
+    def _stop_prefetch(self):
+        """Stop the background decode thread and drop any frames it queued."""
+        if self._prefetch_thread:
+            self._prefetch.stop()
+            self._prefetch_thread.join()
+        self._prefetch_thread = None
+        self._prefetch = None
+        
+    def release(self):
+        """Stop background decoding and release the video capture."""
+        self._stop_prefetch()
+        if self.cap is not None:
+            self.cap.release()
         
     def open_video(self, video_path: str) -> bool:
         """Open a video file for processing."""
         try:
-            self.cap = cv2.VideoCapture(video_path)
+            self.release()
+            self.cap = _open_capture(video_path)
             if not self.cap.isOpened():
                 logger.error(f"Could not open video file: {video_path}")
                 return False
                 
-            self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+            self._set_stream_info(int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)), self.cap.get(cv2.CAP_PROP_FPS))
             self.current_frame_no = 0
             
             # Initialize detector
             from detector import VehicleSpeedDetector
             self.detector = VehicleSpeedDetector()
             
-            # Read first frame to get dimensions
-            ret, first_frame = self.cap.read()
-            if ret:
-                height, width = first_frame.shape[:2]
-                self.detector.set_video_info(width, self.fps)
-                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Reset to start
-            else:
-                logger.error("Could not read first frame")
+            # Dimensions come from the container, without decoding a frame
+            width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            if width <= 0 or height <= 0:
+                logger.error("Could not read video dimensions")
                 return False
                 
+            if width > self.max_display_width:
+                step, rem = divmod(width, self.max_display_width)
+                self._display_step = step if rem == 0 else 0
+                width, height = self.max_display_width, int(height * (self.max_display_width / width))
+                self._display_size = (width, height)
+                self._display_buf = np.empty((height, width, 3), np.uint8)
+            else:
+                self._display_size = self._display_buf = None
+                self._display_step = 0
+            # The detector sees the downscaled frames, so calibrate it for them
+            self.detector.set_video_info(width, self.fps, height)
+                
             return True
             
         except Exception as e:
@@ -175,18 +415,52 @@ class VideoProcessor:
             if self.cap is None or not self.cap.isOpened():
                 return False
                 
-            ret, frame = self.cap.read()
-            if not ret:
-                return False
+            if self.enable_threading:
+                if self._prefetch_thread is None:
+                    self._start_prefetch()
+                frames = self._prefetch
+                # Left held if the previous call failed before releasing it
+                if self._prefetch_held:
+                    frames.release()
+                    self._prefetch_held = False
+                items = frames.peek()
+                while not items:
+                    if frames.processing_done.is_set():
+                        # finish() follows the last put(), so look once more
+                        items = frames.peek()
+                        if not items:
+                            self._stop_prefetch()
+                            return False
+                        break
+                    frames.wait_for_frame()
+                    items = frames.peek()
+                frame = items[0][1]
+                self._prefetch_held = True
+            else:
+                ret, frame = self.cap.read()
+                if not ret:
+                    return False
                 
             self.current_frame_no += 1
             
             # Process only every nth frame based on frame_skip
             if self.current_frame_no % self.frame_skip == 0:
                 # Use a smaller frame size for display if the video is large
-                h, w = frame.shape[:2]
-                if w > 1280:
-                    display_frame = cv2.resize(frame, (1280, int(h * (1280/w))))
+                if self._display_step:
+                    # Whole-number ratio (e.g. 3840 -> 1280): take every nth pixel
+                    n = self._display_step
+                    display_frame = self._display_buf
+                    np.copyto(display_frame, frame[:display_frame.shape[0] * n:n, ::n])
+                elif self._display_size is not None:
+                    display_frame = cv2.resize(frame, self._display_size, dst=self._display_buf,
+                                               interpolation=cv2.INTER_AREA)
+                elif self._prefetch_held:
+                    # The decoder reuses the ring slot once it is released, so
+                    # publish a copy that stays put until the next shown frame
+                    display_frame = self._display_buf
+                    if display_frame is None or display_frame.shape != frame.shape:
+                        display_frame = self._display_buf = np.empty_like(frame)
+                    np.copyto(display_frame, frame)
                 else:
                     display_frame = frame
                 
@@ -194,6 +468,12 @@ class VideoProcessor:
                 processed_frame, speed = self.detector.process_frame(display_frame)
                 self.current_frame = processed_frame
                 self.current_speed = speed
+                
+            # Nothing published points into the ring, so its slot can go back
+            # to the decoder now, whether or not this frame was skipped
+            if self._prefetch_held:
+                self._prefetch.release()
+                self._prefetch_held = False
             
             return True
             
@@ -204,7 +484,7 @@ class VideoProcessor:
     def select_vehicle(self, x: int, y: int):
         """Select a vehicle for tracking at the given coordinates."""
         if self.detector:
-            self.detector.select_object(cv2.EVENT_LBUTTONDOWN, x, y, None, None)
+            self.detector.select_point(x, y)
             
     def toggle_speed_display(self, show: bool):
         """Toggle speed display on/off."""